@@ -0,0 +1,183 @@
+import asyncio
+import logging
+
+import httpx
+from forecasting_tools import GeneralLlm
+from forecasting_tools.ai_models.ai_utils.response_types import (
+    TextTokenCostResponse,
+)
+from forecasting_tools.ai_models.general_llm import ModelInputType
+
+logger = logging.getLogger(__name__)
+
+
+class BatchedVLLMLlm(GeneralLlm):
+    """
+    GeneralLlm for a self hosted vLLM (OpenAI compatible) server.
+
+    Prompts that arrive within `coalescing_window_seconds` of each other are sent together
+    in one `/completions` request (`prompt` is a list), so vLLM's continuous batching can run
+    them side by side and share the prefill of identical prompts. `invoke` works as usual,
+    each call just waits for its own completion out of the batch.
+
+    `/completions` takes raw text, so chat messages are rendered with `message_template` and
+    `generation_prompt` (ChatML by default). Change them to match your model's chat template.
+
+    The dispatcher and http client are started on the first call in a loop. Call `aclose` before the loop ends.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        coalescing_window_seconds: float = 0.05,
+        max_batch_size: int = 64,
+        message_template: str = "<|im_start|>{role}\n{content}<|im_end|>\n",
+        generation_prompt: str = "<|im_start|>assistant\n",
+        **kwargs,
+    ) -> None:
+        super().__init__(model, **kwargs)
+        assert (
+            self.litellm_kwargs.get("base_url") is not None
+        ), "base_url of the vLLM server must be set"
+        self.coalescing_window_seconds = coalescing_window_seconds
+        self.max_batch_size = max_batch_size
+        self.message_template = message_template
+        self.generation_prompt = generation_prompt
+        self._queue: (
+            asyncio.Queue[tuple[str, asyncio.Future[TextTokenCostResponse]]]
+            | None
+        ) = None
+        self._dispatcher: asyncio.Task | None = None
+        self._batches_in_flight: set[asyncio.Task] = set()
+        self._http_client: httpx.AsyncClient | None = None
+
+    async def aclose(self) -> None:
+        """
+        Waits for the batches already sent, then stops the dispatcher and closes the http client.
+        Prompts still waiting in the queue are cancelled.
+        """
+        if self._batches_in_flight:
+            await asyncio.gather(*self._batches_in_flight, return_exceptions=True)
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, response = self._queue.get_nowait()
+                response.cancel()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self._queue = None
+        self._dispatcher = None
+        self._http_client = None
+
+    async def _mockable_direct_call_to_model(
+        self, prompt: ModelInputType
+    ) -> TextTokenCostResponse:
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._dispatcher = loop.create_task(self._dispatch_batches())
+            self._http_client = httpx.AsyncClient(
+                timeout=self.litellm_kwargs["timeout"]
+            )  # One pooled client per loop, reused by every batch
+        assert self._queue is not None
+        response: asyncio.Future[TextTokenCostResponse] = loop.create_future()
+        self._queue.put_nowait((self._render_prompt(prompt), response))
+        return await response
+
+    def _render_prompt(self, prompt: ModelInputType) -> str:
+        rendered_messages = [
+            self.message_template.format_map(message)
+            for message in self.model_input_to_message(prompt)
+        ]
+        return "".join(rendered_messages) + self.generation_prompt
+
+    async def _dispatch_batches(self) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            window_end = loop.time() + self.coalescing_window_seconds
+            try:
+                while len(batch) < self.max_batch_size:
+                    time_left = window_end - loop.time()
+                    if time_left <= 0:
+                        break
+                    try:
+                        batch.append(
+                            await asyncio.wait_for(self._queue.get(), time_left)
+                        )
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                for _, response in batch:  # Collected but never sent, so nothing else would resolve them
+                    response.cancel()
+                raise
+            # Sent in the background so the next window can fill while vLLM works on this one
+            batch_task = loop.create_task(self._send_batch(batch))
+            self._batches_in_flight.add(batch_task)
+            batch_task.add_done_callback(self._batches_in_flight.discard)
+
+    async def _send_batch(
+        self,
+        batch: list[tuple[str, asyncio.Future[TextTokenCostResponse]]],
+    ) -> None:
+        prompts = [prompt for prompt, _ in batch]
+        responses = [response for _, response in batch]
+        logger.debug(f"Sending batch of {len(prompts)} prompts to vLLM")
+        try:
+            completions = await self._request_completions(prompts)
+            for response, completion in zip(responses, completions):
+                if not response.done():
+                    response.set_result(completion)
+        except Exception as e:
+            for response in responses:
+                if not response.done():
+                    response.set_exception(e)
+
+    async def _request_completions(
+        self, prompts: list[str]
+    ) -> list[TextTokenCostResponse]:
+        payload = {
+            "model": self._litellm_model,
+            "prompt": prompts,
+            "n": 1,
+            "temperature": self.litellm_kwargs.get("temperature"),
+        }
+        max_tokens = self.litellm_kwargs.get(
+            "max_tokens"
+        ) or self.litellm_kwargs.get("max_completion_tokens")
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+        headers = {}
+        if self.litellm_kwargs.get("api_key"):
+            headers["Authorization"] = f"Bearer {self.litellm_kwargs['api_key']}"
+
+        base_url = self.litellm_kwargs["base_url"].rstrip("/")
+        assert self._http_client is not None
+        http_response = await self._http_client.post(
+            f"{base_url}/completions", json=payload, headers=headers
+        )
+        http_response.raise_for_status()
+        response_json = http_response.json()
+
+        choices = sorted(response_json["choices"], key=lambda c: c["index"])
+        assert len(choices) == len(
+            prompts
+        ), f"Expected {len(prompts)} completions but got {len(choices)}"
+        usage = response_json.get("usage") or {}
+        # vLLM only reports usage for the whole batch, so it is split evenly between the prompts
+        prompt_tokens = usage.get("prompt_tokens", 0) // len(prompts)
+        completion_tokens = usage.get("completion_tokens", 0) // len(prompts)
+        return [
+            TextTokenCostResponse(
+                data=choice["text"],
+                prompt_tokens_used=prompt_tokens,
+                completion_tokens_used=completion_tokens,
+                total_tokens_used=prompt_tokens + completion_tokens,
+                model=self.model,
+                cost=0,  # Self hosted
+            )
+            for choice in choices
+        ]
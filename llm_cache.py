@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CacheBackend(ABC):
+    """
+    Stores json serializable values under string keys.
+    Backends that do blocking I/O set `blocking` so LLMCache calls them from a thread instead of the event loop.
+    """
+
+    blocking: bool = False
+
+    @abstractmethod
+    def get(self, key: str) -> Any | None:
+        raise NotImplementedError("Subclass should implement this method")
+
+    @abstractmethod
+    def set(self, key: str, value: Any) -> None:
+        raise NotImplementedError("Subclass should implement this method")
+
+
+class InMemoryLruBackend(CacheBackend):
+    def __init__(self, max_entries: int = 512) -> None:
+        assert max_entries > 0, "Must allow at least one entry"
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, Any] = OrderedDict()
+
+    def get(self, key: str) -> Any | None:
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def set(self, key: str, value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class SqliteBackend(CacheBackend):
+    """
+    Persists entries to a sqlite file so they survive between runs.
+    Entries older than `max_age_seconds` are treated as missing so research doesn't go stale.
+    """
+
+    blocking = True
+
+    def __init__(
+        self, file_path: str, max_age_seconds: float | None = None
+    ) -> None:
+        self.file_path = file_path
+        self.max_age_seconds = max_age_seconds
+        self._table_created = False
+
+    def get(self, key: str) -> Any | None:
+        if not os.path.exists(self.file_path):
+            return None
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT value, created_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        if (
+            self.max_age_seconds is not None
+            and time.time() - created_at > self.max_age_seconds
+        ):
+            return None
+        return orjson.loads(value)
+
+    def set(self, key: str, value: Any) -> None:
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, orjson.dumps(value).decode(), time.time()),
+            )
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        if not self._table_created:
+            folder = os.path.dirname(self.file_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+        connection = sqlite3.connect(self.file_path)
+        try:
+            with connection:  # Commits on success, rolls back on error
+                if not self._table_created:
+                    connection.execute(
+                        "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+                    )
+                    self._table_created = True
+                yield connection
+        finally:
+            connection.close()
+
+
+class LLMCache:
+    """
+    Caches llm/search responses so the same call (e.g. while rerunning test questions or retrying)
+    is only paid for once.
+
+    Backends are checked in order (put the fastest first) and a hit in a slower backend
+    is copied into the faster ones. Empty values are never cached.
+    """
+
+    def __init__(self, backends: list[CacheBackend]) -> None:
+        assert backends, "Must have at least one backend"
+        self.backends = backends
+
+    @staticmethod
+    def make_key(**parts: Any) -> str:
+        # Keys include whole prompts, so orjson is used over json since it is several times faster on large strings
+        serialized_parts = orjson.dumps(
+            parts, option=orjson.OPT_SORT_KEYS, default=str
+        )
+        return hashlib.sha256(serialized_parts).hexdigest()
+
+    async def get(self, key: str) -> Any | None:
+        for i, backend in enumerate(self.backends):
+            try:
+                value = await self._call_backend(backend.get, key)
+            except Exception as e:
+                logger.warning(
+                    f"Could not read from {backend.__class__.__name__}: {e}"
+                )
+                continue
+            if value is not None:
+                for faster_backend in self.backends[:i]:
+                    await self._call_backend(faster_backend.set, key, value)
+                return value
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        if not value:
+            return
+        for backend in self.backends:
+            try:
+                await self._call_backend(backend.set, key, value)
+            except Exception as e:
+                logger.warning(
+                    f"Could not write to {backend.__class__.__name__}: {e}"
+                )
+
+    async def get_or_set(
+        self, key: str, create_value: Callable[[], Awaitable[T]]
+    ) -> T:
+        cached_value = await self.get(key)
+        if cached_value is not None:
+            return cached_value
+        value = await create_value()
+        await self.set(key, value)
+        return value
+
+    @staticmethod
+    async def _call_backend(method: Callable[..., T], *args: Any) -> T:
+        backend = getattr(method, "__self__", None)
+        if getattr(backend, "blocking", False):
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
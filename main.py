@@ -1,17 +1,30 @@
 import argparse
 import asyncio
+import copy
+import functools
+import importlib.util
+import inspect
 import logging
 import os
-from datetime import datetime
-from typing import Literal
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Coroutine, Literal, Sequence
 
+import httpx
+import litellm
+import numpy as np
+import orjson
 from forecasting_tools import (
     AskNewsSearcher,
     BinaryQuestion,
     ForecastBot,
+    ForecastReport,
     GeneralLlm,
     MetaculusApi,
     MetaculusQuestion,
+    MonetaryCostManager,
     MultipleChoiceQuestion,
     NumericDistribution,
     NumericQuestion,
@@ -21,10 +34,43 @@ from forecasting_tools import (
     SmartSearcher,
     clean_indents,
 )
+from forecasting_tools.ai_models.general_llm import ModelInputType
+from forecasting_tools.ai_models.resource_managers.refreshing_bucket_rate_limiter import (
+    RefreshingBucketRateLimiter,
+)
+from forecasting_tools.data_models.data_organizer import PredictionTypes
+from forecasting_tools.data_models.forecast_report import (
+    ResearchWithPredictions,
+)
+from forecasting_tools.data_models.questions import DateQuestion
+
+from batched_vllm_llm import BatchedVLLMLlm
+from llm_cache import InMemoryLruBackend, LLMCache, SqliteBackend
 
 logger = logging.getLogger(__name__)
 
 
+def _create_rate_limiters(
+    requests_per_minute: int, tokens_per_minute: int
+) -> tuple[RefreshingBucketRateLimiter, RefreshingBucketRateLimiter]:
+    request_bucket = RefreshingBucketRateLimiter(
+        capacity=requests_per_minute,
+        refresh_rate=requests_per_minute / 60,
+    )
+    token_bucket = RefreshingBucketRateLimiter(
+        capacity=tokens_per_minute,
+        refresh_rate=tokens_per_minute / 60,
+    )
+    return request_bucket, token_bucket
+
+
+def _get_answer_tail(reasoning: str, max_chars: int = 512) -> str:
+    # The final answer is always at the end, so extraction only needs to scan the last few whole lines
+    if len(reasoning) <= max_chars:
+        return reasoning
+    return reasoning[-max_chars:].partition("\n")[2]
+
+
 class TemplateForecaster(ForecastBot):
     """
     This is a copy of the template bot for Q2 2025 Metaculus AI Tournament.
@@ -39,322 +85,1178 @@ class TemplateForecaster(ForecastBot):
     - Load questions from Metaculus
     - For each question
         - Execute run_research a number of times equal to research_reports_per_question
-        - Execute respective run_forecast function `predictions_per_research_report * research_reports_per_question` times
+        - Sample up to `predictions_per_research_report` forecasts per research report from the respective forecast prompt in small batched llm calls, stopping early once they agree
         - Aggregate the predictions
         - Submit prediction (if publish_reports_to_metaculus is True)
     - Return a list of ForecastReport objects
 
     Only the research and forecast functions need to be implemented in ForecastBot subclasses.
 
-    If you end up having trouble with rate limits and want to try a more sophisticated rate limiter try:
-    ```
-    from forecasting_tools.ai_models.resource_managers.refreshing_bucket_rate_limiter import RefreshingBucketRateLimiter
-    rate_limiter = RefreshingBucketRateLimiter(
-        capacity=2,
-        refresh_rate=1,
-    ) # Allows 1 request per second on average with a burst of 2 requests initially. Set this as a class variable
-    await self.rate_limiter.wait_till_able_to_acquire_resources(1) # 1 because it's consuming 1 request (use more if you are adding a token limit)
-    ```
+    Rate limits are handled per upstream provider in `_rate_limiters`. Each provider has a
+    RefreshingBucketRateLimiter for requests per minute and one for (estimated) tokens per minute.
+    They are applied right where each provider is called, so many questions can be in flight at once
+    while bursts still stay under the provider's limits. Set them to whatever your accounts allow.
     Additionally OpenRouter has large rate limits immediately on account creation
     """
 
-    _max_concurrent_questions = 2  # Set this to whatever works for your search-provider/ai-model rate limits
-    _concurrency_limiter = asyncio.Semaphore(_max_concurrent_questions)
+    _rate_limiters = {  # (requests per minute, tokens per minute)
+        "default_llm": _create_rate_limiters(500, 200_000),
+        "perplexity": _create_rate_limiters(50, 1_000_000),
+        "openrouter": _create_rate_limiters(200, 1_000_000),
+        "exa": _create_rate_limiters(60, 1_000_000),
+        "asknews": _create_rate_limiters(6, 1_000_000),
+    }
+    _early_exit_batch_size = 2
+    _early_exit_min_samples = 4
+    _early_exit_epsilon = 0.1  # Binary/multiple choice predictions agree once their coefficient of variation is under this
+    _early_exit_numeric_epsilon = 0.02  # Numeric predictions agree once the std of their medians is under this fraction of the question's range
+    _use_n_sampling = True  # Set to False if your provider rejects the `n` parameter (samples are then requested one call at a time)
+    _llm_cache = LLMCache(
+        [
+            InMemoryLruBackend(max_entries=512),
+            SqliteBackend(
+                "cache/llm_cache.sqlite", max_age_seconds=12 * 60 * 60
+            ),
+        ]
+    )  # Disk entries expire after 12 hours so research doesn't go stale between runs
+    _session_cache = LLMCache(
+        [InMemoryLruBackend(max_entries=512)]
+    )  # Sampled (temperature > 0) forecasts are only reused within a run, so each run still draws fresh samples
+    _today: str | None = None
+    _local_vllm_base_url = "http://localhost:8000/v1"  # A default llm pointed here gets its prompts batched with BatchedVLLMLlm
+    _http_client: httpx.AsyncClient | None = None
+    _http_client_loop: asyncio.AbstractEventLoop | None = None
+    _jsonl_lock = threading.Lock()
+    _prewarm_urls = {  # Env var that means the host will be used: url to open a connection to
+        "METACULUS_TOKEN": "https://llm-proxy.metaculus.com",
+        "OPENAI_API_KEY": "https://api.openai.com",
+        "OPENROUTER_API_KEY": "https://openrouter.ai",
+        "PERPLEXITY_API_KEY": "https://api.perplexity.ai",
+    }
+
+    async def forecast_questions(
+        self,
+        questions: Sequence[MetaculusQuestion],
+        return_exceptions: bool = False,
+    ) -> list[ForecastReport] | list[ForecastReport | BaseException]:
+        # One date for the whole batch keeps every prompt in it byte-identical, even if the date flips mid-run
+        self._today = datetime.now(timezone.utc).date().isoformat()
+        await self._set_up_shared_http_client()
+        try:
+            return await super().forecast_questions(questions, return_exceptions)
+        finally:
+            if isinstance(self._default_llm, BatchedVLLMLlm):
+                await self._default_llm.aclose()
+
+    @classmethod
+    async def _set_up_shared_http_client(cls) -> None:
+        """
+        Gives litellm one http client per event loop and opens a connection to each provider the run will use,
+        so the first llm calls don't wait on connection setup. The client is left open for the loop's lifetime
+        since litellm caches its provider clients per loop and they keep using it in later forecast_questions calls.
+        A new loop gets a new client since httpx clients can't be reused across loops.
+        """
+        loop = asyncio.get_running_loop()
+        if cls._http_client is not None and cls._http_client_loop is loop:
+            return
+        cls._http_client = httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None,  # Needs the optional `h2` package
+            limits=httpx.Limits(
+                max_keepalive_connections=64, max_connections=128
+            ),
+            timeout=httpx.Timeout(200.0),
+        )
+        cls._http_client_loop = loop
+        litellm.aclient_session = cls._http_client
+        urls_to_prewarm = [
+            url for env_var, url in cls._prewarm_urls.items() if os.getenv(env_var)
+        ]
+        await asyncio.gather(
+            *[
+                cls._http_client.head(url, timeout=5)  # An unreachable host shouldn't hold up the run
+                for url in urls_to_prewarm
+            ],
+            return_exceptions=True,  # Any response (or none) is fine, this only opens the connection
+        )
+
+    async def _run_individual_question_with_error_propagation(
+        self, question: MetaculusQuestion
+    ) -> ForecastReport:
+        report = await super()._run_individual_question_with_error_propagation(
+            question
+        )
+        file_path = os.getenv("FORECAST_REPORTS_JSONL_PATH")
+        if file_path:
+            # Reports are several KB, so they are written in a thread to keep the event loop free
+            await asyncio.to_thread(
+                self._append_report_to_jsonl, report, file_path
+            )
+        return report
+
+    @classmethod
+    def _append_report_to_jsonl(
+        cls, report: ForecastReport, file_path: str
+    ) -> None:
+        """
+        Called with FORECAST_REPORTS_JSONL_PATH (if set) as soon as each question finishes, so long tournament
+        runs keep their results even if the process dies before the end.
+        """
+        line = orjson.dumps(report.to_json(), default=str) + b"\n"
+        folder = os.path.dirname(file_path)
+        with cls._jsonl_lock:  # Reports finishing at the same time are written from separate threads
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            with open(file_path, "ab") as file:
+                file.write(line)
+
+    def _get_today(self) -> str:
+        if self._today is None:
+            self._today = datetime.now(timezone.utc).date().isoformat()
+        return self._today
+
+    @functools.cached_property
+    def _default_llm(self) -> GeneralLlm:
+        # Resolved once so a model given by name isn't rebuilt into a new GeneralLlm on every call
+        llm = self.get_llm("default", "llm")
+        base_url = llm.litellm_kwargs.get("base_url") or ""
+        if base_url.rstrip("/") == self._local_vllm_base_url and not isinstance(
+            llm, BatchedVLLMLlm
+        ):
+            llm = BatchedVLLMLlm(
+                model=llm.model,
+                allowed_tries=llm.allowed_tries,
+                **{k: v for k, v in llm.litellm_kwargs.items() if k != "model"},
+            )
+        return llm
+
+    @functools.cached_property
+    def _research_in_flight(self) -> dict[str, asyncio.Task[str]]:
+        return {}
 
     async def run_research(self, question: MetaculusQuestion) -> str:
-        async with self._concurrency_limiter:
+        """
+        Concurrent research requests for the same question (e.g. several research reports per question)
+        share one in-flight run instead of each calling the providers.
+        """
+        key = str(question.id_of_question or question.page_url)
+        research_task = self._research_in_flight.get(key)
+        if research_task is None:
+            research_task = asyncio.create_task(self._research_question(question))
+            self._research_in_flight[key] = research_task
+            research_task.add_done_callback(
+                lambda _: self._research_in_flight.pop(key, None)
+            )
+        # Shielded so one caller being cancelled doesn't cancel the run for the others
+        return await asyncio.shield(research_task)
+
+    async def _research_question(self, question: MetaculusQuestion) -> str:
+        research = ""
+        research_calls = self._get_research_calls(question.question_text)
+        if not research_calls:
+            logger.warning(
+                f"No research provider found when processing question URL {question.page_url}. Will pass back empty string."
+            )
             research = ""
-            if os.getenv("ASKNEWS_CLIENT_ID") and os.getenv("ASKNEWS_SECRET"):
-                research = await AskNewsSearcher().get_formatted_news_async(
-                    question.question_text
-                )
-            elif os.getenv("EXA_API_KEY"):
-                research = await self._call_exa_smart_searcher(
-                    question.question_text
-                )
-            elif os.getenv("PERPLEXITY_API_KEY"):
-                research = await self._call_perplexity(question.question_text)
-            elif os.getenv("OPENROUTER_API_KEY"):
-                research = await self._call_perplexity(
-                    question.question_text, use_open_router=True
-                )
-            else:
-                logger.warning(
-                    f"No research provider found when processing question URL {question.page_url}. Will pass back empty string."
-                )
-                research = ""
-            logger.info(
-                f"Found Research for URL {question.page_url}:\n{research}"
+        elif os.getenv("RUN_PARALLEL_RESEARCH") == "1":
+            research = await self._get_first_non_empty_research(
+                research_calls
             )
-            return research
+        else:
+            research = await research_calls[0]()
+        logger.info(
+            f"Found Research for URL {question.page_url}:\n{research}"
+        )
+        return research
+
+    def _get_research_calls(
+        self, question: str
+    ) -> list[Callable[[], Coroutine[Any, Any, str]]]:
+        """
+        Returns a call for each research provider there are credentials for, in order of preference.
+        Only the first is used unless RUN_PARALLEL_RESEARCH=1 (costs more since every provider is called).
+        """
+        research_calls: list[Callable[[], Coroutine[Any, Any, str]]] = []
+        if os.getenv("ASKNEWS_CLIENT_ID") and os.getenv("ASKNEWS_SECRET"):
+            research_calls.append(lambda: self._call_asknews(question))
+        if os.getenv("EXA_API_KEY"):
+            research_calls.append(
+                lambda: self._call_exa_smart_searcher(question)
+            )
+        if os.getenv("PERPLEXITY_API_KEY"):
+            research_calls.append(lambda: self._call_perplexity(question))
+        elif os.getenv("OPENROUTER_API_KEY"):
+            research_calls.append(
+                lambda: self._call_perplexity(question, use_open_router=True)
+            )
+        return research_calls
+
+    @staticmethod
+    async def _get_first_non_empty_research(
+        research_calls: list[Callable[[], Coroutine[Any, Any, str]]],
+    ) -> str:
+        """
+        Runs every research call at once and returns the first non-empty result, cancelling the rest.
+        Raises the first error only if every provider failed.
+        """
+        tasks = [asyncio.create_task(call()) for call in research_calls]
+        pending = set(tasks)
+        errors: list[BaseException] = []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in [task for task in tasks if task in done]:
+                    error = task.exception()
+                    if error is not None:
+                        logger.warning(f"Research provider failed: {error}")
+                        errors.append(error)
+                    elif task.result().strip():
+                        return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+        if len(errors) == len(tasks):
+            raise errors[0]
+        return ""
+
+    async def _call_asknews(self, question: str) -> str:
+        async def search_news() -> str:
+            # AskNewsSearcher runs two searches per call (latest news and the news archive)
+            await self._wait_for_rate_limit("asknews", question, num_requests=2)
+            return await AskNewsSearcher().get_formatted_news_async(question)
+
+        cache_key = LLMCache.make_key(model="asknews", prompt=question)
+        research = await self._llm_cache.get_or_set(cache_key, search_news)
+        return research
+
+    _PERPLEXITY_TEMPLATE = clean_indents(
+        """
+        You are an assistant to a superforecaster.
+        The superforecaster will give you a question they intend to forecast on.
+        To be a great assistant, you generate a concise but detailed rundown of the most relevant news, including if the question would resolve Yes or No based on current information.
+        You do not produce forecasts yourself.
+
+        Question:
+        {question}
+        """
+    )  # NOTE: The metac bot in Q1 put everything but the question in the system prompt.
 
     async def _call_perplexity(
         self, question: str, use_open_router: bool = False
     ) -> str:
-        prompt = clean_indents(
-            f"""
-            You are an assistant to a superforecaster.
-            The superforecaster will give you a question they intend to forecast on.
-            To be a great assistant, you generate a concise but detailed rundown of the most relevant news, including if the question would resolve Yes or No based on current information.
-            You do not produce forecasts yourself.
-
-            Question:
-            {question}
-            """
-        )  # NOTE: The metac bot in Q1 put everything but the question in the system prompt.
+        prompt = self._PERPLEXITY_TEMPLATE.format_map({"question": question})
         if use_open_router:
             model_name = "openrouter/perplexity/sonar-reasoning"
+            provider = "openrouter"
         else:
             model_name = "perplexity/sonar-pro"  # perplexity/sonar-reasoning and perplexity/sonar are cheaper, but do only 1 search
+            provider = "perplexity"
         model = GeneralLlm(
             model=model_name,
             temperature=0.1,
         )
-        response = await model.invoke(prompt)
+
+        async def invoke_model() -> str:
+            await self._wait_for_rate_limit(provider, prompt)
+            return await model.invoke(prompt)
+
+        cache_key = LLMCache.make_key(
+            model=model_name, prompt=prompt, temperature=0.1
+        )
+        response = await self._llm_cache.get_or_set(cache_key, invoke_model)
         return response
 
+    _EXA_SMART_SEARCHER_TEMPLATE = (
+        "You are an assistant to a superforecaster. The superforecaster will give"
+        "you a question they intend to forecast on. To be a great assistant, you generate"
+        "a concise but detailed rundown of the most relevant news, including if the question"
+        "would resolve Yes or No based on current information. You do not produce forecasts yourself."
+        "\n\nThe question is: {question}"
+    )  # You can ask the searcher to filter by date, exclude/include a domain, and run specific searches for finding sources vs finding highlights within a source
+
     async def _call_exa_smart_searcher(self, question: str) -> str:
         """
         SmartSearcher is a custom class that is a wrapper around an search on Exa.ai
         """
+        model = self._default_llm
         searcher = SmartSearcher(
-            model=self.get_llm("default", "llm"),
+            model=model,
             temperature=0,
             num_searches_to_run=2,
             num_sites_per_search=10,
         )
-        prompt = (
-            "You are an assistant to a superforecaster. The superforecaster will give"
-            "you a question they intend to forecast on. To be a great assistant, you generate"
-            "a concise but detailed rundown of the most relevant news, including if the question"
-            "would resolve Yes or No based on current information. You do not produce forecasts yourself."
-            f"\n\nThe question is: {question}"
-        )  # You can ask the searcher to filter by date, exclude/include a domain, and run specific searches for finding sources vs finding highlights within a source
-        response = await searcher.invoke(prompt)
+        prompt = self._EXA_SMART_SEARCHER_TEMPLATE.format_map(
+            {"question": question}
+        )
+
+        async def invoke_searcher() -> str:
+            await self._wait_for_rate_limit("exa", prompt)
+            return await searcher.invoke(prompt)
+
+        cache_key = LLMCache.make_key(
+            model=f"exa_smart_searcher/{model.model}",
+            prompt=prompt,
+            temperature=0,
+        )
+        response = await self._llm_cache.get_or_set(cache_key, invoke_searcher)
         return response
 
+    _RESEARCH_SUMMARY_TEMPLATE = clean_indents(
+        """
+        You are an assistant to a superforecaster.
+        Summarise the research below for the superforecaster in at most 400 words. The research tries to help answer the following question:
+        {question_text}
+
+        Keep the facts that matter for forecasting: key dates and deadlines, numbers and trends, base rates,
+        the current status quo, and what experts and markets expect. Drop anything that doesn't bear on the question.
+        Only summarise the research. Do not answer the question or add opinions.
+        At the end list the sources that were used (copy links verbatim if possible).
+
+        The research is:
+        {research}
+        """
+    )
+
+    @functools.cached_property
+    def _summarizer_llm(self) -> GeneralLlm:
+        return self.get_llm("summarizer", "llm")
+
+    async def summarize_research(
+        self, question: MetaculusQuestion, research: str
+    ) -> str:
+        """
+        Condenses the research into a short précis that is shared by all the forecast prompts,
+        so each sample doesn't pay for the full research as input tokens (see use_research_summary_to_forecast).
+        Summaries are cached on the research itself, so a question's research is only summarised once.
+        """
+        default_summary_size = 2500
+        if len(research) < default_summary_size:
+            return research
+
+        logger.info(f"Summarizing research for question: {question.page_url}")
+        model = self._summarizer_llm
+        prompt = self._RESEARCH_SUMMARY_TEMPLATE.format_map(
+            {"question_text": question.question_text, "research": research}
+        )
+
+        async def invoke_model() -> str:
+            await self._wait_for_rate_limit("default_llm", prompt)
+            return await model.invoke(prompt)
+
+        cache_key = LLMCache.make_key(
+            model=f"research_summary/{model.model}",
+            prompt=prompt,
+            temperature=model.litellm_kwargs.get("temperature"),
+        )
+        try:
+            return await self._llm_cache.get_or_set(cache_key, invoke_model)
+        except Exception as e:
+            logger.warning(
+                f"Could not summarize research. Defaulting to first {default_summary_size} characters: {e}"
+            )
+            return f"{research[:default_summary_size]}..."
+
+    @classmethod
+    async def _wait_for_rate_limit(
+        cls, provider: str, prompt: ModelInputType, num_requests: int = 1
+    ) -> None:
+        request_bucket, token_bucket = cls._rate_limiters[provider]
+        estimated_tokens = len(str(prompt)) // 4  # Rough estimate of the input tokens
+        await request_bucket.wait_till_able_to_acquire_resources(num_requests)
+        await token_bucket.wait_till_able_to_acquire_resources(
+            min(estimated_tokens, int(token_bucket.capacity))
+        )
+
+    async def _research_and_make_predictions(
+        self, question: MetaculusQuestion
+    ) -> ResearchWithPredictions[PredictionTypes]:
+        """
+        Same as the parent's version, except the `predictions_per_research_report` identical
+        prompts are sampled together through `_invoke_n` instead of calling `_make_prediction` once per prediction
+        """
+        notepad = await self._get_notepad(question)
+        notepad.num_research_reports_attempted += 1
+        research_report_number = notepad.num_research_reports_attempted  # Read now, since concurrent reports keep incrementing it while this one awaits
+        research = await self.run_research(question)
+        summary_report = await self.summarize_research(question, research)
+        research_to_use = (
+            summary_report
+            if self.use_research_summary_to_forecast
+            else research
+        )
+
+        valid_predictions, errors, exception_group = (
+            await self._make_predictions(
+                question,
+                research_to_use,
+                self.predictions_per_research_report,
+                research_report_number,
+            )
+        )
+        if errors:
+            logger.warning(f"Encountered errors while predicting: {errors}")
+        if len(valid_predictions) == 0:
+            assert exception_group, "Exception group should not be None"
+            self._reraise_exception_with_prepended_message(
+                exception_group,
+                "Error while running research and predictions",
+            )
+        return ResearchWithPredictions(
+            research_report=research,
+            summary_report=summary_report,
+            errors=errors,
+            predictions=valid_predictions,
+        )
+
+    async def _make_predictions(
+        self,
+        question: MetaculusQuestion,
+        research: str,
+        num_predictions: int,
+        research_report_number: int,
+    ) -> tuple[
+        list[ReasonedPrediction[PredictionTypes]],
+        list[str],
+        ExceptionGroup | None,
+    ]:
+        """
+        Samples are drawn in batches of `_early_exit_batch_size`. Once at least `_early_exit_min_samples`
+        predictions are in and `_predictions_agree`, the remaining samples are skipped since they would
+        barely move the aggregate.
+        `research_report_number` keeps each report's sample sets apart in the cache.
+        """
+        notepad = await self._get_notepad(question)
+
+        prompt, parse_reasoning = self._create_prompt_and_parser(
+            question, research
+        )
+        valid_predictions: list[ReasonedPrediction[PredictionTypes]] = []
+        error_messages: list[str] = []
+        exceptions: list[Exception] = []
+        num_sampled = 0
+        while num_sampled < num_predictions:
+            batch_size = min(
+                self._early_exit_batch_size, num_predictions - num_sampled
+            )
+            notepad.num_predictions_attempted += batch_size
+            reasonings = await self._invoke_n(
+                prompt,
+                batch_size,
+                sample_set_id=f"{question.page_url}#{research_report_number}#{num_sampled}",
+                final_answer_pattern=self._get_final_answer_pattern(question),
+                response_format=self._get_response_format(question),
+            )
+            num_sampled += batch_size
+            # Parsing runs several regexes over each multi-KB sample, so it is done in a thread
+            # to keep the event loop free for the other questions in flight
+            batch_predictions, batch_error_messages, batch_exceptions = (
+                await asyncio.to_thread(
+                    self._parse_reasonings, reasonings, parse_reasoning
+                )
+            )
+            valid_predictions.extend(batch_predictions)
+            error_messages.extend(batch_error_messages)
+            exceptions.extend(batch_exceptions)
+            if len(
+                valid_predictions
+            ) >= self._early_exit_min_samples and self._predictions_agree(
+                question, valid_predictions
+            ):
+                logger.info(
+                    f"Stopping early for URL {question.page_url} after {num_sampled} of {num_predictions} samples since predictions agree"
+                )
+                break
+
+        exception_group = (
+            ExceptionGroup(f"Errors: {error_messages}", exceptions)
+            if exceptions
+            else None
+        )
+        return valid_predictions, error_messages, exception_group
+
+    @staticmethod
+    def _parse_reasonings(
+        reasonings: list[str | BaseException],
+        parse_reasoning: Callable[[str], ReasonedPrediction[PredictionTypes]],
+    ) -> tuple[
+        list[ReasonedPrediction[PredictionTypes]], list[str], list[Exception]
+    ]:
+        valid_predictions: list[ReasonedPrediction[PredictionTypes]] = []
+        error_messages: list[str] = []
+        exceptions: list[Exception] = []
+        for reasoning in reasonings:
+            try:
+                if isinstance(reasoning, BaseException):
+                    raise reasoning
+                valid_predictions.append(parse_reasoning(reasoning))
+            except Exception as e:
+                error_messages.append(f"{e.__class__.__name__}: {e}")
+                exceptions.append(e)
+        return valid_predictions, error_messages, exceptions
+
+    def _predictions_agree(
+        self,
+        question: MetaculusQuestion,
+        predictions: list[ReasonedPrediction[PredictionTypes]],
+    ) -> bool:
+        """
+        Binary and multiple choice predictions agree once their coefficient of variation (std / mean, the largest
+        across options for multiple choice) is under `_early_exit_epsilon`. Numeric predictions are compared on
+        the median (or closest declared) percentile, with the std taken as a fraction of the question's range,
+        since a coefficient of variation depends on how far the values are from 0 rather than how much they disagree.
+        """
+        values = []
+        for prediction in predictions:
+            value = prediction.prediction_value
+            if isinstance(value, PredictedOptionList):
+                values.append(
+                    [option.probability for option in value.predicted_options]
+                )
+            elif isinstance(value, NumericDistribution):
+                median = min(
+                    value.declared_percentiles,
+                    key=lambda p: abs(p.percentile - 0.5),
+                )
+                values.append([median.value])
+            else:
+                values.append([value])
+        samples = np.array(values, dtype=float)
+        stds = samples.std(axis=0)
+
+        if isinstance(question, NumericQuestion):
+            question_range = question.upper_bound - question.lower_bound
+            if question_range <= 0:
+                return False
+            return float(stds.max()) / question_range < self._early_exit_numeric_epsilon
+
+        means = np.abs(samples.mean(axis=0))
+        if np.any(means == 0):
+            return bool(np.all(stds == 0))
+        return float(np.max(stds / means)) < self._early_exit_epsilon
+
+    def _create_prompt_and_parser(
+        self, question: MetaculusQuestion, research: str
+    ) -> tuple[
+        ModelInputType, Callable[[str], ReasonedPrediction[PredictionTypes]]
+    ]:
+        if isinstance(question, BinaryQuestion):
+            prompt = self._create_binary_prompt(question, research)
+            parse_reasoning = lambda r: self._binary_prediction_from_reasoning(
+                question, r
+            )
+        elif isinstance(question, MultipleChoiceQuestion):
+            prompt = self._create_multiple_choice_prompt(question, research)
+            parse_reasoning = (
+                lambda r: self._multiple_choice_prediction_from_reasoning(
+                    question, r
+                )
+            )
+        elif isinstance(question, NumericQuestion):
+            prompt = self._create_numeric_prompt(question, research)
+            parse_reasoning = lambda r: self._numeric_prediction_from_reasoning(
+                question, r
+            )
+        elif isinstance(question, DateQuestion):
+            raise NotImplementedError("Date questions not supported yet")
+        else:
+            raise ValueError(f"Unknown question type: {type(question)}")
+        return prompt, parse_reasoning  # type: ignore
+
+    def _get_final_answer_pattern(
+        self, question: MetaculusQuestion
+    ) -> re.Pattern[str] | None:
+        if isinstance(question, NumericQuestion):
+            return self._NUMERIC_FINAL_ANSWER_PATTERN
+        # Binary answers are a single JSON object that ends the sample anyway, and option names in
+        # the final multiple choice list also show up earlier in the reasoning, so there is no reliable marker
+        return None
+
+    def _get_response_format(
+        self, question: MetaculusQuestion
+    ) -> dict[str, Any] | None:
+        if isinstance(question, BinaryQuestion):
+            return self._BINARY_RESPONSE_FORMAT
+        return None
+
+    async def _invoke_n(
+        self,
+        prompt: ModelInputType,
+        n: int,
+        sample_set_id: str | None = None,
+        final_answer_pattern: re.Pattern[str] | None = None,
+        response_format: dict[str, Any] | None = None,
+    ) -> list[str | BaseException]:
+        """
+        Samples `n` completions of the same prompt from the default llm.
+        Results (and failures) are returned like `asyncio.gather(..., return_exceptions=True)` would.
+
+        Successful sample sets are cached under their `sample_set_id` (e.g. question url + research report number
+        + batch index), so separate sample sets never replay each other. Deterministic (temperature 0) calls are kept
+        on disk. Otherwise they are only cached in memory, and only if a `sample_set_id` is given, so repeats within
+        a session hit while separate runs still draw fresh samples.
+        """
+        llm = self._default_llm
+        temperature = llm.litellm_kwargs.get("temperature")
+        is_deterministic = temperature == 0  # None is the provider's default temperature, which usually samples
+        cache = self._llm_cache if is_deterministic else self._session_cache
+        cache_key = None
+        if is_deterministic or sample_set_id is not None:
+            cache_key = LLMCache.make_key(
+                model=llm.model,
+                prompt=prompt,
+                temperature=temperature,
+                n=n,
+                sample_set_id=sample_set_id,
+                response_format=response_format,
+            )
+            cached_results = await cache.get(cache_key)
+            if cached_results is not None:
+                return cached_results
+
+        results = await self._sample_completions(
+            llm, prompt, n, final_answer_pattern, response_format
+        )
+        if cache_key is not None and all(
+            isinstance(result, str) for result in results
+        ):
+            await cache.set(cache_key, results)
+        return results
+
+    async def _sample_completions(
+        self,
+        llm: GeneralLlm,
+        prompt: ModelInputType,
+        n: int,
+        final_answer_pattern: re.Pattern[str] | None,
+        response_format: dict[str, Any] | None,
+    ) -> list[str | BaseException]:
+        """
+        All samples are requested in a single streamed completion call using litellm's `n` parameter.
+        If the provider drops `n` (or the call fails) the missing samples are made up with concurrent calls
+        that share the same prompt string, so providers with prefix caching can still reuse the prefill.
+        A BatchedVLLMLlm always uses the separate calls, since it coalesces them into one batched request itself.
+
+        `response_format` is passed to the separate calls too. BatchedVLLMLlm samples are the exception: a batch mixes
+        prompts of every question type, so they are unconstrained and rely on the prompt asking for JSON.
+        """
+        results: list[str | BaseException] = []
+        if not isinstance(llm, BatchedVLLMLlm) and (
+            n == 1 or self._use_n_sampling
+        ):
+            try:
+                results.extend(
+                    await self._stream_samples(
+                        llm, prompt, n, final_answer_pattern, response_format
+                    )
+                )
+            except Exception as e:
+                logger.warning(
+                    f"Could not sample {n} completions in one call to {llm.model}. Falling back to separate calls: {e}"
+                )
+        num_missing = n - len(results)
+        if num_missing > 0:
+            fallback_llm = llm
+            if response_format is not None and not isinstance(
+                llm, BatchedVLLMLlm
+            ):
+                fallback_llm = copy.copy(llm)  # Copied since the metaculus proxy settings can't be passed back into __init__
+                fallback_llm.litellm_kwargs = {
+                    **llm.litellm_kwargs,
+                    "response_format": response_format,
+                }
+            results.extend(
+                await asyncio.gather(
+                    *[
+                        self._invoke_with_rate_limit(fallback_llm, prompt)
+                        for _ in range(num_missing)
+                    ],
+                    return_exceptions=True,
+                )
+            )
+        return results[:n]
+
+    async def _invoke_with_rate_limit(
+        self, llm: GeneralLlm, prompt: ModelInputType
+    ) -> str:
+        await self._wait_for_rate_limit("default_llm", prompt)
+        return await llm.invoke(prompt)
+
+    async def _stream_samples(
+        self,
+        llm: GeneralLlm,
+        prompt: ModelInputType,
+        n: int,
+        final_answer_pattern: re.Pattern[str] | None,
+        response_format: dict[str, Any] | None = None,
+    ) -> list[str]:
+        """
+        Streams `n` samples from one completion call. The tail of each sample is checked against
+        `final_answer_pattern` as chunks arrive. Once every sample has either written its final answer
+        or finished, the stream is closed instead of waiting on any trailing text, but only if the provider
+        has already reported usage. Otherwise it is read to the end, since the final usage chunk is the only
+        place hidden reasoning tokens (e.g. o4-mini's) are counted and the cost limits depend on them.
+        """
+        await self._wait_for_rate_limit("default_llm", prompt)
+        MonetaryCostManager.raise_error_if_limit_would_be_reached()
+        litellm.drop_params = True  # Providers that don't support `n` return one choice, which _sample_completions tops up
+        extra_kwargs: dict[str, Any] = {}
+        if response_format is not None:
+            extra_kwargs["response_format"] = response_format
+        stream = await litellm.acompletion(
+            messages=llm.model_input_to_message(prompt),
+            **{
+                **llm.litellm_kwargs,
+                "n": n,
+                "stream": True,
+                "stream_options": {"include_usage": True},
+                **extra_kwargs,
+            },
+        )
+        chunks_per_sample: dict[int, list[str]] = defaultdict(list)
+        tail_per_sample: dict[int, str] = defaultdict(str)
+        finished_samples: set[int] = set()
+        stopped_at_final_answer = False
+        usage = None
+        try:
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                for choice in chunk.choices:
+                    content = choice.delta.content
+                    if content:
+                        chunks_per_sample[choice.index].append(content)
+                        tail_per_sample[choice.index] = (
+                            tail_per_sample[choice.index] + content
+                        )[-1000:]
+                        if final_answer_pattern and final_answer_pattern.search(
+                            tail_per_sample[choice.index]
+                        ):
+                            finished_samples.add(choice.index)
+                            stopped_at_final_answer = True
+                    if choice.finish_reason is not None:
+                        finished_samples.add(choice.index)
+                if (
+                    stopped_at_final_answer
+                    and usage is not None
+                    and len(finished_samples) >= n
+                ):
+                    break
+        finally:
+            # Closing the connection is what makes the provider stop generating after an early break.
+            # It also hands the connection back to the shared pool
+            await self._close_stream(stream)
+
+        reasonings = [
+            "".join(chunks_per_sample[i]) for i in sorted(chunks_per_sample)
+        ]
+        try:
+            if usage is not None:
+                prompt_tokens = usage.prompt_tokens
+                completion_tokens = usage.completion_tokens
+            else:
+                # The provider never reported usage, so only the visible text can be counted. Hidden reasoning
+                # tokens (e.g. o4-mini's) are not part of it, so this undercounts the cost for reasoning models
+                prompt_tokens = llm.input_to_tokens(prompt)
+                completion_tokens = sum(
+                    llm.text_to_tokens_direct(reasoning)
+                    for reasoning in reasonings
+                )
+            cost = llm.calculate_cost_from_tokens(
+                prompt_tkns=prompt_tokens, completion_tkns=completion_tokens
+            )
+        except ValueError:
+            cost = 0  # Model is not supported by litellm's cost tracking
+        MonetaryCostManager.increase_current_usage_in_parent_managers(cost)
+        return [reasoning for reasoning in reasonings if reasoning]
+
+    @staticmethod
+    async def _close_stream(stream: Any) -> None:
+        # litellm wraps the provider's stream, which is an openai AsyncStream (`close`) or an async generator (`aclose`)
+        completion_stream = getattr(stream, "completion_stream", stream)
+        close = getattr(completion_stream, "close", None) or getattr(
+            completion_stream, "aclose", None
+        )
+        if close is None:
+            return
+        result = close()
+        if inspect.isawaitable(result):
+            await result
+
+    async def _invoke_once(
+        self, question: MetaculusQuestion, prompt: ModelInputType
+    ) -> str:
+        reasoning = (
+            await self._invoke_n(
+                prompt,
+                1,
+                final_answer_pattern=self._get_final_answer_pattern(question),
+                response_format=self._get_response_format(question),
+            )
+        )[0]
+        if isinstance(reasoning, BaseException):
+            raise reasoning
+        return reasoning
+
+    async def _run_forecast_on_binary(
+        self, question: BinaryQuestion, research: str
+    ) -> ReasonedPrediction[float]:
+        prompt = self._create_binary_prompt(question, research)
+        reasoning = await self._invoke_once(question, prompt)
+        return self._binary_prediction_from_reasoning(question, reasoning)
+
+    # The forecast prompts are split into a static system prompt (identical across questions and sent first,
+    # so provider prompt-prefix caching can hit) and a per-question template that holds everything that varies.
+    # All of them are cleaned once at class load, so building a prompt is just a `str.format_map` call.
+
     # Revised DRE 5/31/2025 encourage forecast and probability precision of 1%
     # Modified from DRE 5/17/2025 prompt
-    async def _run_forecast_on_binary(
+    _BINARY_SYSTEM_PROMPT = clean_indents(
+        """
+        You are a professional forecaster interviewing for a job.
+        You will be given your interview question, its background and resolution criteria, what your research assistant says, and today's date.
+
+        1% precision
+        You commit to forecast with 1% precision. This means you do not preferentially choose forecast probabilities
+        of 5%, 10%, 15%, 20% etc. Instead you make your best forecast, allowing values such as 12%, 17%, 34%, 48%, 71%... 
+        Particularly when aggregating several forecasts, this may result in a more accurate overall forecast.
+
+        Before answering you write:
+        (a) The time left until the outcome to the question is known.
+        (b) The status quo outcome if nothing changed.
+        (c) The expectations of experts and markets.
+        (d) A brief description of a scenario that results in a No outcome.
+        (e) A brief description of a scenario that results in a Yes outcome.
+
+        You write your rationale remembering that good forecasters put extra weight on the status quo outcome since the world changes slowly most of the time.
+
+        ************
+        Group the evidence
+        Review the evidence from your reseach assistant and group it into three buckets of approximately the same size:
+        Bucket 1) Evidence that would indicate a relatively low forecast
+        Bucket 2) Evidence that would indicate a relatively high forecast
+        Bucket 3) Evidence that would indicate a central forecast
+
+        ************
+        Multi-world considerations
+        Now you want to explore ranges of reasonable, possible forecasts, aiming for 1% precision. 
+        You consider three worlds:
+        1) Low_World: review the bucket 1 evidence from your reseach assistant that the forecast could be low.
+        - What would an appropriate base rate be for this world?
+        - What would be a low forecast estimate for this world?
+        - What would be a mid forecast estimate for this world?
+        - What would be a high forecast estimate for this world?
+        2) High_World: review the bucket 3 evidence from your reseach assistant that the forecast could be high.
+        - What would an appropriate base rate be for this world?
+        - What would be a low forecast estimate for this world?
+        - What would be a mid forecast estimate for this world?
+        - What would be a high forecast estimate for this world?
+        3) Mid_World: review the bucket 3 evidence from your reseach assistant that the forecast could be around the central views and trends.
+        - What would an appropriate base rate be for this world:
+        - What would be a low forecast estimate be for this world?
+        - What would be a mid forecast estimate for this world?
+        - What would be a high forecast estimate be for this world?
+
+        ************
+        Final expected distribution of reasonable forecasts
+        You order the 9 estimates from low to high because you know that these values represent a range of resonable forecasts.
+
+        Considering the 9 estimates ordered from low to high:
+        - Project a distribution of reasonable forecasts with percentiles of probability P10, P50 and P90
+        - Reflect on the 50th percentile and adjust as necessary
+        - The 50th percentile is a good estimate of forecast probability, but you modify your final answer based on your analysis
+        ************
+
+        Work through all of the above before you answer, but do NOT restate the buckets, worlds or tables.
+        Your answer is a single JSON object with:
+        - "rationale": a brief summary of (a) to (e), the evidence buckets and the three worlds
+        - "p10", "p50", "p90": the percentiles of your distribution of reasonable forecasts, 0-100
+        - "probability": your final answer, 0-100
+        """
+    )
+    _BINARY_TEMPLATE = clean_indents(
+        """
+        Your interview question is:
+        {question_text}
+
+        Question background:
+        {background_info}
+
+
+        This question's outcome will be determined by the specific criteria below. These criteria have not yet been satisfied:
+        {resolution_criteria}
+
+        {fine_print}
+
+
+        Your research assistant says:
+        {research}
+
+        Today is {today}.
+        """
+    )
+    _BINARY_FINAL_ANSWER_PATTERN = re.compile(r"Probability:\s*(\d{1,3})\s*%")
+    _BINARY_JSON_PROBABILITY_PATTERN = re.compile(r'"probability"\s*:\s*(\d+(?:\.\d+)?)')
+    _BINARY_RESPONSE_FORMAT = {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "binary_forecast",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "rationale": {"type": "string"},
+                    "p10": {"type": "integer"},
+                    "p50": {"type": "integer"},
+                    "p90": {"type": "integer"},
+                    "probability": {"type": "integer"},
+                },
+                "required": ["rationale", "p10", "p50", "p90", "probability"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+    def _create_binary_prompt(
         self, question: BinaryQuestion, research: str
+    ) -> list[dict[str, str]]:
+        question_prompt = self._BINARY_TEMPLATE.format_map(
+            {
+                "question_text": question.question_text,
+                "background_info": question.background_info,
+                "resolution_criteria": question.resolution_criteria,
+                "fine_print": question.fine_print,
+                "research": research,
+                "today": self._get_today(),
+            }
+        )
+        return [
+            {"role": "system", "content": self._BINARY_SYSTEM_PROMPT},
+            {"role": "user", "content": question_prompt},
+        ]
+
+    def _binary_prediction_from_reasoning(
+        self, question: BinaryQuestion, reasoning: str
     ) -> ReasonedPrediction[float]:
-        prompt = clean_indents(
-            f"""
-            You are a professional forecaster interviewing for a job.
-
-            Your interview question is:
-            {question.question_text}
-
-            Question background:
-            {question.background_info}
-
-
-            This question's outcome will be determined by the specific criteria below. These criteria have not yet been satisfied:
-            {question.resolution_criteria}
-
-            {question.fine_print}
-
-
-            Your research assistant says:
-            {research}
-
-            Today is {datetime.now().strftime("%Y-%m-%d")}.
-            
-            1% precision
-            You commit to forecast with 1% precision. This means you do not preferentially choose forecast probabilities
-            of 5%, 10%, 15%, 20% etc. Instead you make your best forecast, allowing values such as 12%, 17%, 34%, 48%, 71%... 
-            Particularly when aggregating several forecasts, this may result in a more accurate overall forecast.
-            
-            Before answering you write:
-            (a) The time left until the outcome to the question is known.
-            (b) The status quo outcome if nothing changed.
-            (c) The expectations of experts and markets.
-            (d) A brief description of a scenario that results in a No outcome.
-            (e) A brief description of a scenario that results in a Yes outcome.
-
-            You write your rationale remembering that good forecasters put extra weight on the status quo outcome since the world changes slowly most of the time.
-            
-            ************
-            Group the evidence
-            Review the evidence from your reseach assistant and group it into three buckets of approximately the same size:
-            Bucket 1) Evidence that would indicate a relatively low forecast
-            Bucket 2) Evidence that would indicate a relatively high forecast
-            Bucket 3) Evidence that would indicate a central forecast
-            
-            ************
-            Multi-world considerations
-            Now you want to explore ranges of reasonable, possible forecasts, aiming for 1% precision. 
-            You consider three worlds:
-            1) Low_World: review the bucket 1 evidence from your reseach assistant that the forecast could be low.
-            - What would an appropriate base rate be for this world?
-            - What would be a low forecast estimate for this world?
-            - What would be a mid forecast estimate for this world?
-            - What would be a high forecast estimate for this world?
-            2) High_World: review the bucket 3 evidence from your reseach assistant that the forecast could be high.
-            - What would an appropriate base rate be for this world?
-            - What would be a low forecast estimate for this world?
-            - What would be a mid forecast estimate for this world?
-            - What would be a high forecast estimate for this world?
-            3) Mid_World: review the bucket 3 evidence from your reseach assistant that the forecast could be around the central views and trends.
-            - What would an appropriate base rate be for this world:
-            - What would be a low forecast estimate be for this world?
-            - What would be a mid forecast estimate for this world?
-            - What would be a high forecast estimate be for this world?
-            
-            ************
-            Reference CSV
-            Now, for future reference, make a CSV based on values from your multi-world reasoning.
-            Headings: World_name, Base rate, Low Forecast, Mid Forecast, High Forecast
-            Rows: Low_World, Mid_World, High_World
-            
-            ************
-            Final expected distribution of reasonable forecasts
-            You order the 9 estimates from low to high because you know that these values represent a range of resonable forecasts.
-            
-            Considering the 9 estimates ordered from low to high:
-            - Project a distribution of reasonable forecasts
-            - Make a CSV with percentiles of probability from P10 to p90 on increments of 10
-            - Reflect on the 50th percentile and adjust as necessary
-            - The 50th percentile is a good estimate of forecast probability, but you modify your final answer based on your analysis
-            ************
-
-            The last thing you write is your final answer as: "Probability: ZZ%", 0-100
-            """
-        )
-        reasoning = await self.get_llm("default", "llm").invoke(prompt)
-        prediction: float = PredictionExtractor.extract_last_percentage_value(
-            reasoning, max_prediction=1, min_prediction=0
+        reasoning = self._binary_json_to_reasoning(reasoning)
+        final_answers = self._BINARY_FINAL_ANSWER_PATTERN.findall(
+            _get_answer_tail(reasoning)
         )
+        json_answers = self._BINARY_JSON_PROBABILITY_PATTERN.findall(reasoning)
+        if final_answers:
+            prediction = min(1, max(0, int(final_answers[-1]) / 100))
+        elif json_answers:
+            percentage = self._parse_percentage(json_answers[-1])
+            if percentage is None:
+                raise ValueError(
+                    f"Probability {json_answers[-1]} looks like a decimal probability rather than a percentage"
+                )
+            prediction = min(1, max(0, percentage / 100))
+        else:  # Answer wasn't written in the requested format
+            prediction = PredictionExtractor.extract_last_percentage_value(
+                reasoning, max_prediction=1, min_prediction=0
+            )
         logger.info(
             f"Forecasted URL {question.page_url} as {prediction} with reasoning:\n{reasoning}"
         )
         return ReasonedPrediction(
             prediction_value=prediction, reasoning=reasoning
         )
-    
+
+    @staticmethod
+    def _binary_json_to_reasoning(answer: str) -> str:
+        """
+        Turns the JSON answer into readable reasoning for the report, ending in the usual "Probability: ZZ%".
+        Anything that isn't valid JSON (e.g. from a provider that ignored `response_format`) is returned as is.
+        """
+        try:
+            forecast = orjson.loads(answer[answer.index("{") : answer.rindex("}") + 1])
+            percentage = TemplateForecaster._parse_percentage(
+                forecast["probability"]
+            )
+            if percentage is None:
+                return answer  # Left for _binary_prediction_from_reasoning to reject
+            return "\n\n".join(
+                [
+                    forecast["rationale"],
+                    f"Percentiles of reasonable forecasts: P10 {forecast['p10']}%, P50 {forecast['p50']}%, P90 {forecast['p90']}%",
+                    f"Probability: {round(percentage)}%",
+                ]
+            )
+        except (ValueError, KeyError, TypeError):  # orjson.JSONDecodeError is a ValueError
+            return answer
+
+    @staticmethod
+    def _parse_percentage(value: Any) -> float | None:
+        """
+        Returns None for values below 1 with a fractional part (e.g. 0.35), since those are almost certainly
+        decimal probabilities and truncating them would turn them into an extreme 0% forecast.
+        """
+        percentage = float(value)
+        if percentage < 1 and not percentage.is_integer():
+            return None
+        return percentage
+
+    async def _run_forecast_on_multiple_choice(
+        self, question: MultipleChoiceQuestion, research: str
+    ) -> ReasonedPrediction[PredictedOptionList]:
+        prompt = self._create_multiple_choice_prompt(question, research)
+        reasoning = await self._invoke_once(question, prompt)
+        return self._multiple_choice_prediction_from_reasoning(
+            question, reasoning
+        )
+
     # DRE 6/1/2025 prompt: Multiworld, 1% precision
     # Built from Binary 5/31/2025 and Multiple Choice 5/17/2025 (revised)
-    async def _run_forecast_on_multiple_choice(
+    _MC_SYSTEM_PROMPT = clean_indents(
+        """
+        You are a professional forecaster interviewing for a job.
+        You will be given your interview question, its options, background and resolution criteria, what your research assistant says, and today's date.
+
+        1% precision
+        You commit to forecast with 1% precision. This means you do not preferentially choose forecast probabilities
+        of 5%, 10%, 15%, 20% etc. Instead you make your best forecast, allowing values such as 12%, 17%, 34%, 48%, 71%... 
+        Particularly when aggregating several forecasts, this may result in a more accurate overall forecast.
+
+        Before answering you write:
+        (a) The time left until the outcome to the question is known.
+        (b) The status quo outcome if nothing changed.
+        (c) The expectations of experts and markets.
+
+        You write your rationale remembering that (1) good forecasters put extra weight on the status quo outcome 
+        since the world changes slowly most of the time, and (2) good forecasters leave some moderate probability
+        on most options to account for unexpected outcomes.
+
+        ************
+        There are N options in this question, in the order they are listed with the question.
+
+        At this stage, you treat each option as an independent, binary question. 
+
+        For each option you conduct the following steps:
+
+        You write:
+        - The status quo outcome if nothing changed for the option.
+        - The expectations of experts and markets for the option.
+        - A brief description of a scenario that results in a No outcome for the option.
+        - A brief description of a scenario that results in a Yes outcome for the option.
+
+        Group the evidence for the option
+        Review the evidence from your reseach assistant and group it into three buckets of approximately the same size:
+        Bucket 1) Evidence that would indicate a relatively low forecast
+        Bucket 2) Evidence that would indicate a relatively high forecast
+        Bucket 3) Evidence that would indicate a central forecast
+
+        Multi-world considerations for the option
+        Now you want to explore ranges of reasonable possible forecasts. You consider three worlds:
+        1) Low_World: review the bucket 1 evidence from your reseach assistant that the forecast could be low.
+        - What would an appropriate base rate be for this world?
+        - What would be a low forecast estimate for this world?
+        - What would be a mid forecast estimate for this world?
+        - What would be a high forecast estimate for this world?
+        2) High_World: review the bucket 3 evidence from your reseach assistant that the forecast could be high.
+        - What would an appropriate base rate be for this world?
+        - What would be a low forecast estimate for this world?
+        - What would be a mid forecast estimate for this world?
+        - What would be a high forecast estimate for this world?
+        3) Mid_World: review the bucket 3 evidence from your reseach assistant that the forecast could be around the central views and trends.
+        - What would an appropriate base rate be for this world:
+        - What would be a low forecast estimate be for this world?
+        - What would be a mid forecast estimate for this world?
+        - What would be a high forecast estimate be for this world?
+
+        Reference Table for the option
+        Now, for future reference, make a CSV based on values from your multi-world reasoning around the option.
+        Headings: World_name, Base rate, Low Forecast, Mid Forecast, High Forecast
+        Rows: Low_World, Mid_World, High_World
+
+        You order the 9 estimates for the option from low to high because you know that these values represent a 
+        range of resonable forecasts.
+
+        Considering the 9 estimates ordered from low to high for the option
+        - You use your judgment to make a table of with percentiles of probability
+          from P10 to p90 on increments of 10
+        - The 50th percentile is your preliminary estimate of probability for the option
+
+        ************
+        Consolidate and adjust the multiple choice option forecasts
+
+        Sort the option probabilities from highest to lowest and reflect on:
+        - The options should sum to 100%
+        - Does the relative probability of each option make sense?
+        - Does the status quo impact the probability?
+        - Does evidence suggest moving away from the status quo?
+        - Does the evidence indicate the preliminary probability should be adjusted?
+
+        ************
+        Final forecast
+
+        You make your final and best forecast using any adjustments after reflection and remembering to report at 1% or 
+        better precision.
+
+        The last thing you write is your final probabilities for the N options, in the order they are listed with the question, as:
+        Option_A: Probability_A
+        Option_B: Probability_B
+        ...
+        Option_N: Probability_N
+        """
+    )
+    _MC_TEMPLATE = clean_indents(
+        """
+        Your interview question is:
+        {question_text}
+
+        The options are: 
+        {options}
+
+
+        Background:
+        {background_info}
+
+        {resolution_criteria}
+
+        {fine_print}
+
+
+        Your research assistant says:
+        {research}
+
+        Today is {today}.
+        """
+    )
+
+    def _create_multiple_choice_prompt(
         self, question: MultipleChoiceQuestion, research: str
+    ) -> list[dict[str, str]]:
+        question_prompt = self._MC_TEMPLATE.format_map(
+            {
+                "question_text": question.question_text,
+                "options": question.options,
+                "background_info": question.background_info,
+                "resolution_criteria": question.resolution_criteria,
+                "fine_print": question.fine_print,
+                "research": research,
+                "today": self._get_today(),
+            }
+        )
+        return [
+            {"role": "system", "content": self._MC_SYSTEM_PROMPT},
+            {"role": "user", "content": question_prompt},
+        ]
+
+    def _multiple_choice_prediction_from_reasoning(
+        self, question: MultipleChoiceQuestion, reasoning: str
     ) -> ReasonedPrediction[PredictedOptionList]:
-        prompt = clean_indents(
-            f"""
-            You are a professional forecaster interviewing for a job.
-
-            Your interview question is:
-            {question.question_text}
-
-            The options are: 
-            {question.options}
-
-
-            Background:
-            {question.background_info}
-
-            {question.resolution_criteria}
-
-            {question.fine_print}
-            
-
-            Your research assistant says:
-            {research}
-
-            Today is {datetime.now().strftime("%Y-%m-%d")}.
-            
-            1% precision
-            You commit to forecast with 1% precision. This means you do not preferentially choose forecast probabilities
-            of 5%, 10%, 15%, 20% etc. Instead you make your best forecast, allowing values such as 12%, 17%, 34%, 48%, 71%... 
-            Particularly when aggregating several forecasts, this may result in a more accurate overall forecast.
-            
-            Before answering you write:
-            (a) The time left until the outcome to the question is known.
-            (b) The status quo outcome if nothing changed.
-            (c) The expectations of experts and markets.
-            
-            You write your rationale remembering that (1) good forecasters put extra weight on the status quo outcome 
-            since the world changes slowly most of the time, and (2) good forecasters leave some moderate probability
-            on most options to account for unexpected outcomes.
-            
-            ************
-            There are N options in this question, in this order:
-            {question.options}
-            
-            At this stage, you treat each option as an independent, binary question. 
-            
-            For each option you conduct the following steps:
-            
-            You write:
-            - The status quo outcome if nothing changed for the option.
-            - The expectations of experts and markets for the option.
-            - A brief description of a scenario that results in a No outcome for the option.
-            - A brief description of a scenario that results in a Yes outcome for the option.
-            
-            Group the evidence for the option
-            Review the evidence from your reseach assistant and group it into three buckets of approximately the same size:
-            Bucket 1) Evidence that would indicate a relatively low forecast
-            Bucket 2) Evidence that would indicate a relatively high forecast
-            Bucket 3) Evidence that would indicate a central forecast
-            
-            Multi-world considerations for the option
-            Now you want to explore ranges of reasonable possible forecasts. You consider three worlds:
-            1) Low_World: review the bucket 1 evidence from your reseach assistant that the forecast could be low.
-            - What would an appropriate base rate be for this world?
-            - What would be a low forecast estimate for this world?
-            - What would be a mid forecast estimate for this world?
-            - What would be a high forecast estimate for this world?
-            2) High_World: review the bucket 3 evidence from your reseach assistant that the forecast could be high.
-            - What would an appropriate base rate be for this world?
-            - What would be a low forecast estimate for this world?
-            - What would be a mid forecast estimate for this world?
-            - What would be a high forecast estimate for this world?
-            3) Mid_World: review the bucket 3 evidence from your reseach assistant that the forecast could be around the central views and trends.
-            - What would an appropriate base rate be for this world:
-            - What would be a low forecast estimate be for this world?
-            - What would be a mid forecast estimate for this world?
-            - What would be a high forecast estimate be for this world?
-            
-            Reference Table for the option
-            Now, for future reference, make a CSV based on values from your multi-world reasoning around the option.
-            Headings: World_name, Base rate, Low Forecast, Mid Forecast, High Forecast
-            Rows: Low_World, Mid_World, High_World
-            
-            You order the 9 estimates for the option from low to high because you know that these values represent a 
-            range of resonable forecasts.
-            
-            Considering the 9 estimates ordered from low to high for the option
-            - You use your judgment to make a table of with percentiles of probability
-              from P10 to p90 on increments of 10
-            - The 50th percentile is your preliminary estimate of probability for the option
-            
-            ************
-            Consolidate and adjust the multiple choice option forecasts
-            
-            Sort the option probabilities from highest to lowest and reflect on:
-            - The options should sum to 100%
-            - Does the relative probability of each option make sense?
-            - Does the status quo impact the probability?
-            - Does evidence suggest moving away from the status quo?
-            - Does the evidence indicate the preliminary probability should be adjusted?
-            
-            ************
-            Final forecast
-            
-            You make your final and best forecast using any adjustments after reflection and remembering to report at 1% or 
-            better precision.
-            
-            The last thing you write is your final probabilities for the N options in this order {question.options} as:
-            Option_A: Probability_A
-            Option_B: Probability_B
-            ...
-            Option_N: Probability_N
-            """
-        )
-        reasoning = await self.get_llm("default", "llm").invoke(prompt)
-        prediction: PredictedOptionList = (
-            PredictionExtractor.extract_option_list_with_percentage_afterwards(
-                reasoning, question.options
+        try:
+            prediction: PredictedOptionList = (
+                PredictionExtractor.extract_option_list_with_percentage_afterwards(
+                    _get_answer_tail(reasoning), question.options
+                )
+            )
+        except ValueError:  # Long option lists may not fit in the tail
+            prediction = (
+                PredictionExtractor.extract_option_list_with_percentage_afterwards(
+                    reasoning, question.options
+                )
             )
-        )
         logger.info(
             f"Forecasted URL {question.page_url} as {prediction} with reasoning:\n{reasoning}"
         )
@@ -362,114 +1264,163 @@ class TemplateForecaster(ForecastBot):
             prediction_value=prediction, reasoning=reasoning
         )
         
-    # DRE 5/31/2025 Numeric enforcement building on 5/17/2025 prompt
     async def _run_forecast_on_numeric(
         self, question: NumericQuestion, research: str
     ) -> ReasonedPrediction[NumericDistribution]:
+        prompt = self._create_numeric_prompt(question, research)
+        reasoning = await self._invoke_once(question, prompt)
+        return self._numeric_prediction_from_reasoning(question, reasoning)
+
+    # DRE 5/31/2025 Numeric enforcement building on 5/17/2025 prompt
+    _NUMERIC_SYSTEM_PROMPT = clean_indents(
+        """
+        You are a professional forecaster interviewing for a job.
+        You will be given your interview question, its background, resolution criteria and units, what your research assistant says, today's date, and any bounds on the outcome.
+
+        Formatting Instructions:
+        - Please notice the units requested (e.g. whether you represent a number as 1,000,000 or 1 million).
+        - Never use scientific notation.
+        - Always start with a smaller number (more negative if negative) and then increase from there
+
+        Before answering you write:
+        (a) The time left until the outcome to the question is known.
+        (b) The outcome if nothing changed.
+        (c) The outcome if the current trend continued.
+        (d) The expectations of experts and markets.
+        (e) A brief description of an unexpected scenario that results in a low outcome.
+        (f) A brief description of an unexpected scenario that results in a high outcome.
+
+        You remind yourself that good forecasters are humble and set wide 90/10 confidence intervals to account for unknown unknowns.
+
+        ************
+        Group the evidence
+        Review the evidence from your reseach assistant and group it into three buckets of approximately the same size:
+        Bucket 1) Evidence that would indicate a relatively low forecast
+        Bucket 2) Evidence that would indicate a relatively high forecast
+        Bucket 3) Evidence that would indicate a central forecast
+
+        ************
+        Verify the Units for the answer, and write them here
+        You check that those are the same units used above in questions (a), (b), (c), (d), (e), and (f)
+        If the units are in agreement write "units confirmed"
+
+        ************
+        Multi-world considerations
+        For this section, you are careful to report values in the confirmed units for answer
+        You want to explore ranges of reasonable possibilities. You consider three worlds:
+        1) Low_World: review the bucket 1 evidence from your reseach assistant that the forecast could be low.
+        - What would an appropriate base rate be for this world?
+        - What would be a low forecast estimate for this world?
+        - What would be a mid forecast estimate for this world?
+        - What would be a high forecast estimate for this world?
+        2) High_World: review the bucket 3 evidence from your reseach assistant that the forecast could be high.
+        - What would an appropriate base rate be for this world?
+        - What would be a low forecast estimate for this world?
+        - What would be a mid forecast estimate for this world?
+        - What would be a high forecast estimate for this world?
+        3) Mid_World: review the bucket 3 evidence from your reseach assistant that the forecast could be around the central views and trends.
+        - What would an appropriate base rate be for this world:
+        - What would be a low forecast estimate be for this world?
+        - What would be a mid forecast estimate for this world?
+        - What would be a high forecast estimate be for this world? 
+
+        ************
+        Reference CSV
+        Now, for future reference, make a CSV based on values from your multi-world reasoning.
+        Headings: World_name, Base rate, Low Forecast, Mid Forecast, High Forecast
+        Rows: Low_World, Mid_World, High_World
+
+        ************
+        You order the 9 estimates from low to high because you know that these values represent a reasonable range of outcomes.
+
+        ************
+        With those values in mind, you are careful to use the units for answer
+
+        ************
+        The last thing you write is your final answer as:
+        "
+        Percentile 10: XX
+        Percentile 20: XX
+        Percentile 40: XX
+        Percentile 50: XX
+        Percentile 60: XX
+        Percentile 80: XX
+        Percentile 90: XX
+        "
+        """
+    )
+    _NUMERIC_TEMPLATE = clean_indents(
+        """
+        Your interview question is:
+        {question_text}
+
+        Background:
+        {background_info}
+
+        {resolution_criteria}
+
+        {fine_print}
+
+        Units for answer: {units}
+        You write Units for the answer are: (whatever units you determined)
+
+        Your research assistant says:
+        {research}
+
+        Today is {today}.
+
+        {lower_bound_message}
+        {upper_bound_message}
+        """
+    )
+    _NUMERIC_FINAL_ANSWER_PATTERN = re.compile(  # The whole block of 7 percentiles, so a drafted pair earlier in the reasoning doesn't match
+        r"Percentile 10:[^\n]*\d[^\n]*\n"
+        r"(?:[^\n]*Percentile (?:20|40|50|60|80):[^\n]*\d[^\n]*\n){5}"
+        r"[^\n]*Percentile 90:[^\n]*\d[^\n]*\n"
+    )
+    _NUMERIC_FINAL_ANSWER_START_PATTERN = re.compile(r"^.*Percentile 10:", re.MULTILINE)
+
+    def _create_numeric_prompt(
+        self, question: NumericQuestion, research: str
+    ) -> list[dict[str, str]]:
         upper_bound_message, lower_bound_message = (
             self._create_upper_and_lower_bound_messages(question)
         )
-        prompt = clean_indents(
-            f"""
-            You are a professional forecaster interviewing for a job.
-
-            Your interview question is:
-            {question.question_text}
-
-            Background:
-            {question.background_info}
-
-            {question.resolution_criteria}
-
-            {question.fine_print}
-
-            Units for answer: {question.unit_of_measure if question.unit_of_measure else "Not stated (please infer this)"}
-            You write Units for the answer are: (whatever units you determined)
-
-            Your research assistant says:
-            {research}
-
-            Today is {datetime.now().strftime("%Y-%m-%d")}.
-
-            {lower_bound_message}
-            {upper_bound_message}
-
-            Formatting Instructions:
-            - Please notice the units requested (e.g. whether you represent a number as 1,000,000 or 1 million).
-            - Never use scientific notation.
-            - Always start with a smaller number (more negative if negative) and then increase from there
-
-            Before answering you write:
-            (a) The time left until the outcome to the question is known.
-            (b) The outcome if nothing changed.
-            (c) The outcome if the current trend continued.
-            (d) The expectations of experts and markets.
-            (e) A brief description of an unexpected scenario that results in a low outcome.
-            (f) A brief description of an unexpected scenario that results in a high outcome.
-
-            You remind yourself that good forecasters are humble and set wide 90/10 confidence intervals to account for unknown unknowns.
-            
-            ************
-            Group the evidence
-            Review the evidence from your reseach assistant and group it into three buckets of approximately the same size:
-            Bucket 1) Evidence that would indicate a relatively low forecast
-            Bucket 2) Evidence that would indicate a relatively high forecast
-            Bucket 3) Evidence that would indicate a central forecast
-            
-            ************
-            Verify the Units for the answer, and write them here
-            You check that those are the same units used above in questions (a), (b), (c), (d), (e), and (f)
-            If the units are in agreement write "units confirmed"
-            
-            ************
-            Multi-world considerations
-            For this section, you are careful to report values in the confirmed units for answer
-            You want to explore ranges of reasonable possibilities. You consider three worlds:
-            1) Low_World: review the bucket 1 evidence from your reseach assistant that the forecast could be low.
-            - What would an appropriate base rate be for this world?
-            - What would be a low forecast estimate for this world?
-            - What would be a mid forecast estimate for this world?
-            - What would be a high forecast estimate for this world?
-            2) High_World: review the bucket 3 evidence from your reseach assistant that the forecast could be high.
-            - What would an appropriate base rate be for this world?
-            - What would be a low forecast estimate for this world?
-            - What would be a mid forecast estimate for this world?
-            - What would be a high forecast estimate for this world?
-            3) Mid_World: review the bucket 3 evidence from your reseach assistant that the forecast could be around the central views and trends.
-            - What would an appropriate base rate be for this world:
-            - What would be a low forecast estimate be for this world?
-            - What would be a mid forecast estimate for this world?
-            - What would be a high forecast estimate be for this world? 
-
-            ************
-            Reference CSV
-            Now, for future reference, make a CSV based on values from your multi-world reasoning.
-            Headings: World_name, Base rate, Low Forecast, Mid Forecast, High Forecast
-            Rows: Low_World, Mid_World, High_World
-            
-            ************
-            You order the 9 estimates from low to high because you know that these values represent a reasonable range of outcomes.
-            
-            ************
-            With those values in mind, you are careful to use the units for answer
-            
-            ************
-            The last thing you write is your final answer as:
-            "
-            Percentile 10: XX
-            Percentile 20: XX
-            Percentile 40: XX
-            Percentile 50: XX
-            Percentile 60: XX
-            Percentile 80: XX
-            Percentile 90: XX
-            "
-            """
-        )
-        reasoning = await self.get_llm("default", "llm").invoke(prompt)
+        question_prompt = self._NUMERIC_TEMPLATE.format_map(
+            {
+                "question_text": question.question_text,
+                "background_info": question.background_info,
+                "resolution_criteria": question.resolution_criteria,
+                "fine_print": question.fine_print,
+                "units": (
+                    question.unit_of_measure
+                    if question.unit_of_measure
+                    else "Not stated (please infer this)"
+                ),
+                "research": research,
+                "today": self._get_today(),
+                "lower_bound_message": lower_bound_message,
+                "upper_bound_message": upper_bound_message,
+            }
+        )
+        return [
+            {"role": "system", "content": self._NUMERIC_SYSTEM_PROMPT},
+            {"role": "user", "content": question_prompt},
+        ]
+
+    def _numeric_prediction_from_reasoning(
+        self, question: NumericQuestion, reasoning: str
+    ) -> ReasonedPrediction[NumericDistribution]:
+        final_answer_starts = list(
+            self._NUMERIC_FINAL_ANSWER_START_PATTERN.finditer(reasoning)
+        )
+        if final_answer_starts:  # Skip any percentiles drafted earlier in the reasoning
+            final_answer = reasoning[final_answer_starts[-1].start() :]
+        else:
+            final_answer = reasoning
         prediction: NumericDistribution = (
             PredictionExtractor.extract_numeric_distribution_from_list_of_percentile_number_and_probability(
-                reasoning, question
+                final_answer, question
             )
         )
         logger.info(
@@ -497,6 +1448,19 @@ class TemplateForecaster(ForecastBot):
         return upper_bound_message, lower_bound_message
 
 
+async def _get_questions_by_url(
+    question_urls: Sequence[str],
+) -> list[MetaculusQuestion]:
+    # MetaculusApi is sync only, so the fetches run in threads to overlap. Repeated urls are only fetched once
+    unique_urls = list(dict.fromkeys(question_urls))
+    return await asyncio.gather(
+        *[
+            asyncio.to_thread(MetaculusApi.get_question_by_url, question_url)
+            for question_url in unique_urls
+        ]
+    )
+
+
 if __name__ == "__main__":
     logging.basicConfig(
         level=logging.INFO,
@@ -508,6 +1472,14 @@ if __name__ == "__main__":
     litellm_logger.setLevel(logging.WARNING)
     litellm_logger.propagate = False
 
+    # uvloop is optional (`pip install uvloop`, Linux/macOS only) and schedules the many concurrent requests with less overhead
+    try:
+        import uvloop
+
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        logger.info("uvloop is not installed. Using the default asyncio event loop")
+
     parser = argparse.ArgumentParser(
         description="Run the Q1TemplateBot forecasting system"
     )
@@ -531,7 +1503,7 @@ if __name__ == "__main__":
     template_bot = TemplateForecaster(
         research_reports_per_question=1,
         predictions_per_research_report=8, #predictions_per_research_report=8,  # predictions_per_research_report=5
-        use_research_summary_to_forecast=False,
+        use_research_summary_to_forecast=True,  # Forecast prompts get the research summary instead of the full research
         publish_reports_to_metaculus=True,
         folder_to_save_reports_to=None,
         skip_previously_forecasted_questions=True,
@@ -576,10 +1548,7 @@ if __name__ == "__main__":
             #"https://www.metaculus.com/questions/36295/us-tariff-rate-on-goods-imported-into-us-at-yearend-2026/",  # new question chosen by me
         ]
         template_bot.skip_previously_forecasted_questions = False
-        questions = [
-            MetaculusApi.get_question_by_url(question_url)
-            for question_url in EXAMPLE_QUESTIONS
-        ]
+        questions = asyncio.run(_get_questions_by_url(EXAMPLE_QUESTIONS))
         forecast_reports = asyncio.run(
             template_bot.forecast_questions(questions, return_exceptions=True)
         )
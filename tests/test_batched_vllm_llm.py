@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import batched_vllm_llm
+from batched_vllm_llm import BatchedVLLMLlm
+
+
+@pytest.fixture
+def sent_batches(monkeypatch: pytest.MonkeyPatch) -> list[dict]:
+    batches: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        batches.append(body)
+        return httpx.Response(
+            200,
+            json={
+                "choices": [
+                    {"index": i, "text": f"answer to {prompt}"}
+                    for i, prompt in enumerate(body["prompt"])
+                ],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 20},
+            },
+        )
+
+    real_async_client = httpx.AsyncClient
+    monkeypatch.setattr(
+        batched_vllm_llm.httpx,
+        "AsyncClient",
+        lambda **kwargs: real_async_client(
+            transport=httpx.MockTransport(handler), **kwargs
+        ),
+    )
+    return batches
+
+
+def _create_llm(**kwargs) -> BatchedVLLMLlm:
+    return BatchedVLLMLlm(
+        model="openai/test-model",
+        base_url="http://localhost:8000/v1",
+        message_template="{role}: {content}\n",
+        generation_prompt="assistant:",
+        **kwargs,
+    )
+
+
+def test_concurrent_prompts_are_sent_in_one_batch(
+    sent_batches: list[dict],
+) -> None:
+    llm = _create_llm()
+
+    async def run() -> list[str]:
+        answers = await asyncio.gather(
+            *[llm.invoke(f"prompt {i}") for i in range(5)]
+        )
+        await llm.aclose()
+        return answers
+
+    answers = asyncio.run(run())
+
+    assert len(sent_batches) == 1
+    assert sent_batches[0]["model"] == "test-model"
+    assert sent_batches[0]["prompt"] == [
+        f"user: prompt {i}\nassistant:" for i in range(5)
+    ]
+    assert answers == [
+        f"answer to user: prompt {i}\nassistant:" for i in range(5)
+    ]
+
+
+def test_batches_are_split_at_max_batch_size(
+    sent_batches: list[dict],
+) -> None:
+    llm = _create_llm(max_batch_size=2)
+
+    async def run() -> None:
+        await asyncio.gather(*[llm.invoke(f"prompt {i}") for i in range(5)])
+        await llm.aclose()
+
+    asyncio.run(run())
+
+    assert [len(batch["prompt"]) for batch in sent_batches] == [2, 2, 1]
+
+
+def test_prompts_outside_the_window_go_in_separate_batches(
+    sent_batches: list[dict],
+) -> None:
+    llm = _create_llm(coalescing_window_seconds=0.01)
+
+    async def run() -> None:
+        first = asyncio.create_task(llm.invoke("first"))
+        await asyncio.sleep(0.1)
+        await asyncio.gather(first, llm.invoke("second"))
+        await llm.aclose()
+
+    asyncio.run(run())
+
+    assert len(sent_batches) == 2
+
+
+def test_aclose_stops_the_dispatcher(sent_batches: list[dict]) -> None:
+    llm = _create_llm()
+
+    async def run() -> asyncio.Task:
+        await llm.invoke("prompt")
+        dispatcher = llm._dispatcher
+        assert dispatcher is not None
+        await llm.aclose()
+        return dispatcher
+
+    dispatcher = asyncio.run(run())
+
+    assert dispatcher.cancelled()
+    assert llm._dispatcher is None
+    assert llm._http_client is None
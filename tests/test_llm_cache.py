@@ -0,0 +1,82 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+import llm_cache
+from llm_cache import InMemoryLruBackend, LLMCache, SqliteBackend
+
+
+def test_lru_backend_evicts_least_recently_used() -> None:
+    backend = InMemoryLruBackend(max_entries=2)
+    backend.set("a", 1)
+    backend.set("b", 2)
+    assert backend.get("a") == 1  # a is now more recent than b
+    backend.set("c", 3)
+
+    assert backend.get("b") is None
+    assert backend.get("a") == 1
+    assert backend.get("c") == 3
+
+
+def test_sqlite_backend_persists_between_instances(tmp_path: Path) -> None:
+    file_path = str(tmp_path / "cache" / "llm_cache.sqlite")
+    SqliteBackend(file_path).set("key", ["a", "b"])
+
+    assert SqliteBackend(file_path).get("key") == ["a", "b"]
+
+
+def test_sqlite_backend_expires_old_entries(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    backend = SqliteBackend(
+        str(tmp_path / "llm_cache.sqlite"), max_age_seconds=60
+    )
+    monkeypatch.setattr(llm_cache.time, "time", lambda: 1000.0)
+    backend.set("key", "value")
+
+    monkeypatch.setattr(llm_cache.time, "time", lambda: 1059.0)
+    assert backend.get("key") == "value"
+    monkeypatch.setattr(llm_cache.time, "time", lambda: 1061.0)
+    assert backend.get("key") is None
+
+
+def test_make_key_ignores_argument_order() -> None:
+    assert LLMCache.make_key(model="m", prompt="p") == LLMCache.make_key(
+        prompt="p", model="m"
+    )
+    assert LLMCache.make_key(model="m", prompt="p") != LLMCache.make_key(
+        model="m", prompt="q"
+    )
+
+
+def test_hit_in_slower_backend_is_copied_to_faster_ones(
+    tmp_path: Path,
+) -> None:
+    file_path = str(tmp_path / "llm_cache.sqlite")
+    SqliteBackend(file_path).set("key", "value")
+    memory_backend = InMemoryLruBackend()
+    cache = LLMCache([memory_backend, SqliteBackend(file_path)])
+
+    assert asyncio.run(cache.get("key")) == "value"
+    assert memory_backend.get("key") == "value"
+
+
+def test_get_or_set_only_creates_missing_non_empty_values() -> None:
+    cache = LLMCache([InMemoryLruBackend()])
+    calls: list[str] = []
+
+    async def create_value(value: str) -> str:
+        calls.append(value)
+        return value
+
+    async def run() -> list[str]:
+        return [
+            await cache.get_or_set("key", lambda: create_value("first")),
+            await cache.get_or_set("key", lambda: create_value("second")),
+            await cache.get_or_set("empty", lambda: create_value("")),
+            await cache.get_or_set("empty", lambda: create_value("")),
+        ]
+
+    assert asyncio.run(run()) == ["first", "first", "", ""]
+    assert calls == ["first", "", ""]
@@ -0,0 +1,445 @@
+import asyncio
+import json
+from pathlib import Path
+
+import httpx
+import litellm
+import pytest
+from forecasting_tools import (
+    BinaryQuestion,
+    ForecastReport,
+    GeneralLlm,
+    MonetaryCostManager,
+    MultipleChoiceQuestion,
+    NumericQuestion,
+    PredictedOption,
+    PredictedOptionList,
+    ReasonedPrediction,
+)
+
+import main
+from main import TemplateForecaster
+
+
+def _create_binary_question(question_id: int) -> BinaryQuestion:
+    return BinaryQuestion(
+        question_text=f"Will event {question_id} happen?",
+        page_url=f"https://example.com/questions/{question_id}",
+        id_of_question=question_id,
+        id_of_post=question_id,
+        background_info="background",
+        resolution_criteria="resolution criteria",
+        fine_print="fine print",
+    )
+
+
+_BINARY_ANSWER = '{"rationale": "stub", "probability": 40}'
+_NUMERIC_ANSWER = (
+    "Reasoning\n"
+    "Percentile 10: 1\n"
+    "Percentile 20: 2\n"
+    "Percentile 40: 3\n"
+    "Percentile 50: 4\n"
+    "Percentile 60: 5\n"
+    "Percentile 80: 6\n"
+    "Percentile 90: 7\n"
+    "Trailing text after the answer"
+)
+_HIDDEN_REASONING_TOKENS = 500
+
+
+def _create_multiple_choice_question() -> MultipleChoiceQuestion:
+    return MultipleChoiceQuestion(
+        question_text="Which option will happen?",
+        page_url="https://example.com/questions/205",
+        id_of_question=205,
+        id_of_post=205,
+        options=["A", "B", "C"],
+        background_info="background",
+        resolution_criteria="resolution criteria",
+        fine_print="fine print",
+    )
+
+
+def _create_numeric_question() -> NumericQuestion:
+    return NumericQuestion(
+        question_text="In what year will event happen?",
+        page_url="https://example.com/questions/200",
+        id_of_question=200,
+        id_of_post=200,
+        lower_bound=2000,
+        upper_bound=2200,
+        open_lower_bound=True,
+        open_upper_bound=True,
+        background_info="background",
+        resolution_criteria="resolution criteria",
+        fine_print="fine print",
+    )
+
+
+def _percentile_block(median: int) -> str:
+    offsets = {10: -20, 20: -10, 40: -2, 50: 0, 60: 2, 80: 10, 90: 20}
+    return "".join(
+        f"Percentile {percentile}: {median + offset}\n"
+        for percentile, offset in offsets.items()
+    )
+
+
+def _streamed_completion(body: dict, answer: str) -> httpx.Response:
+    """
+    Streams `answer` one line per chunk for each of the `n` choices, then the usage chunk
+    """
+    n = body.get("n") or 1
+    chunks = [
+        {"index": i, "delta": {"role": "assistant", "content": line}}
+        for line in answer.splitlines(keepends=True)
+        for i in range(n)
+    ] + [{"index": i, "delta": {}, "finish_reason": "stop"} for i in range(n)]
+    events = [
+        {
+            "id": "completion",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": body["model"],
+            "choices": [choice],
+        }
+        for choice in chunks
+    ]
+    events.append(
+        {
+            "id": "completion",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": body["model"],
+            "choices": [],
+            "usage": {
+                "prompt_tokens": 10,
+                "completion_tokens": _HIDDEN_REASONING_TOKENS * n,
+                "total_tokens": 10 + _HIDDEN_REASONING_TOKENS * n,
+            },
+        }
+    )
+    content = "".join(f"data: {json.dumps(event)}\n\n" for event in events)
+    return httpx.Response(
+        200,
+        content=(content + "data: [DONE]\n\n").encode(),
+        headers={"content-type": "text/event-stream"},
+    )
+
+
+@pytest.fixture
+def sent_completions(monkeypatch: pytest.MonkeyPatch) -> list[dict]:
+    """
+    Points the bot's shared http client at a stub OpenAI server. Prompts with a `response_format` (binary
+    questions) are answered with 40%, everything else with `_NUMERIC_ANSWER`
+    """
+    completions: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        completions.append(body)
+        answer = _BINARY_ANSWER if body.get("response_format") else _NUMERIC_ANSWER
+        return _streamed_completion(body, answer)
+
+    class StubAsyncClient(httpx.AsyncClient):
+        def __init__(self, **kwargs) -> None:
+            kwargs.pop("http2", None)
+            super().__init__(transport=httpx.MockTransport(handler), **kwargs)
+
+    monkeypatch.setattr(main.httpx, "AsyncClient", StubAsyncClient)
+    # forecasting_tools applies nest_asyncio, so every test runs on the same loop. The shared client and
+    # litellm's provider clients that hold it are dropped so this test's stub is used
+    monkeypatch.setattr(TemplateForecaster, "_http_client", None)
+    litellm.in_memory_llm_clients_cache.flush_cache()
+    for env_var in [
+        "ASKNEWS_CLIENT_ID",
+        "EXA_API_KEY",
+        "PERPLEXITY_API_KEY",
+        "OPENROUTER_API_KEY",
+        "METACULUS_TOKEN",
+        "OPENAI_API_KEY",
+        "FORECAST_REPORTS_JSONL_PATH",
+    ]:
+        monkeypatch.delenv(env_var, raising=False)
+    return completions
+
+
+def _create_bot(
+    research_reports_per_question: int = 1,
+    predictions_per_research_report: int = 2,
+    temperature: float | None = 1,
+) -> TemplateForecaster:
+    return TemplateForecaster(
+        research_reports_per_question=research_reports_per_question,
+        predictions_per_research_report=predictions_per_research_report,
+        publish_reports_to_metaculus=False,
+        llms={
+            "default": GeneralLlm(
+                model="gpt-4o-mini",
+                base_url="http://stub-openai/v1",
+                api_key="stub",
+                temperature=temperature,
+            ),
+            "summarizer": "gpt-4o-mini",
+        },
+    )
+
+
+def test_forecast_questions_can_run_twice_in_one_loop(
+    sent_completions: list[dict],
+) -> None:
+    bot = _create_bot()
+
+    async def run() -> list:
+        first_batch = await bot.forecast_questions(
+            [_create_binary_question(101)], return_exceptions=True
+        )
+        second_batch = await bot.forecast_questions(
+            [_create_binary_question(102)], return_exceptions=True
+        )
+        return first_batch + second_batch
+
+    reports = asyncio.run(run())
+
+    assert all(isinstance(report, ForecastReport) for report in reports)
+    assert [report.prediction for report in reports] == [0.4, 0.4]
+    assert len(sent_completions) == 2
+
+
+def test_research_reports_get_separate_sample_sets(
+    sent_completions: list[dict], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    bot = _create_bot(research_reports_per_question=2)
+    sample_set_ids: list[str | None] = []
+    invoke_n = bot._invoke_n
+
+    async def record_sample_set_id(*args, sample_set_id=None, **kwargs):
+        sample_set_ids.append(sample_set_id)
+        return await invoke_n(*args, sample_set_id=sample_set_id, **kwargs)
+
+    monkeypatch.setattr(bot, "_invoke_n", record_sample_set_id)
+    asyncio.run(bot.forecast_questions([_create_binary_question(103)]))
+
+    assert sorted(sample_set_ids) == [
+        "https://example.com/questions/103#1#0",
+        "https://example.com/questions/103#2#0",
+    ]
+    assert len(sent_completions) == 2
+
+
+def test_default_temperature_batches_are_sampled_separately(
+    sent_completions: list[dict], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(TemplateForecaster, "_early_exit_min_samples", 100)
+    bot = _create_bot(predictions_per_research_report=4, temperature=None)
+
+    asyncio.run(bot.forecast_questions([_create_binary_question(104)]))
+
+    assert len(sent_completions) == 2
+
+
+def test_stream_is_read_to_the_end_for_its_usage(
+    sent_completions: list[dict],
+) -> None:
+    bot = _create_bot()
+    llm = bot._default_llm
+
+    async def run() -> list[str]:
+        await bot._set_up_shared_http_client()
+        return await bot._stream_samples(
+            llm, "prompt", 1, TemplateForecaster._NUMERIC_FINAL_ANSWER_PATTERN
+        )
+
+    with MonetaryCostManager(10) as cost_manager:
+        reasonings = asyncio.run(run())
+
+    assert reasonings == [_NUMERIC_ANSWER]
+    assert cost_manager.current_usage == pytest.approx(
+        llm.calculate_cost_from_tokens(
+            prompt_tkns=10, completion_tkns=_HIDDEN_REASONING_TOKENS
+        )
+    )
+
+
+def test_reports_are_appended_to_jsonl(
+    sent_completions: list[dict],
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path: Path,
+) -> None:
+    file_path = tmp_path / "reports" / "reports.jsonl"
+    monkeypatch.setenv("FORECAST_REPORTS_JSONL_PATH", str(file_path))
+    bot = _create_bot()
+
+    asyncio.run(
+        bot.forecast_questions(
+            [_create_binary_question(105), _create_binary_question(106)]
+        )
+    )
+
+    lines = [json.loads(line) for line in file_path.read_text().splitlines()]
+    assert sorted(line["question"]["id_of_question"] for line in lines) == [
+        105,
+        106,
+    ]
+
+
+@pytest.mark.parametrize(
+    "answer",
+    [
+        '{"rationale": "Base rates are low", "p10": 20, "p50": 35, "p90": 50, "probability": 35}',
+        'Here is my forecast:\n```json\n{"rationale": "Base rates are low", "p10": 20, "p50": 35, "p90": 50, "probability": 35}\n```',
+    ],
+)
+def test_binary_json_answer_is_parsed(answer: str) -> None:
+    prediction = _create_bot()._binary_prediction_from_reasoning(
+        _create_binary_question(201), answer
+    )
+
+    assert prediction.prediction_value == pytest.approx(0.35)
+    assert prediction.reasoning.startswith("Base rates are low")
+    assert prediction.reasoning.endswith("Probability: 35%")
+
+
+def test_binary_json_decimal_probability_is_rejected() -> None:
+    answer = '{"rationale": "r", "p10": 0.2, "p50": 0.35, "p90": 0.5, "probability": 0.35}'
+
+    with pytest.raises(ValueError, match="decimal probability"):
+        _create_bot()._binary_prediction_from_reasoning(
+            _create_binary_question(202), answer
+        )
+
+
+def test_binary_answer_without_json_falls_back_to_the_final_percentage() -> None:
+    answer = "I first thought 80%, but on reflection it is less likely.\nProbability: 37%"
+
+    prediction = _create_bot()._binary_prediction_from_reasoning(
+        _create_binary_question(203), answer
+    )
+
+    assert prediction.prediction_value == pytest.approx(0.37)
+
+
+def test_numeric_stop_pattern_waits_for_the_whole_percentile_block() -> None:
+    pattern = TemplateForecaster._NUMERIC_FINAL_ANSWER_PATTERN
+    drafted_pair = "A first guess:\nPercentile 10: 2010\nPercentile 90: 2150\nLet me refine that.\n"
+
+    assert pattern.search(drafted_pair) is None
+    assert pattern.search(drafted_pair + _percentile_block(2100)) is not None
+
+
+def test_numeric_answer_skips_drafted_percentiles() -> None:
+    reasoning = (
+        "A first guess:\n"
+        + _percentile_block(2050)
+        + "That seems too early.\n"
+        + _percentile_block(2100)
+    )
+
+    prediction = _create_bot()._numeric_prediction_from_reasoning(
+        _create_numeric_question(), reasoning
+    )
+
+    assert [p.value for p in prediction.prediction_value.declared_percentiles] == [
+        2080,
+        2090,
+        2098,
+        2100,
+        2102,
+        2110,
+        2120,
+    ]
+
+
+def _binary_predictions(values: list[float]) -> list[ReasonedPrediction]:
+    return [
+        ReasonedPrediction(prediction_value=value, reasoning="")
+        for value in values
+    ]
+
+
+def _multiple_choice_predictions(
+    values: list[list[float]],
+) -> list[ReasonedPrediction]:
+    return [
+        ReasonedPrediction(
+            prediction_value=PredictedOptionList(
+                predicted_options=[
+                    PredictedOption(option_name=name, probability=probability)
+                    for name, probability in zip(["A", "B", "C"], probabilities)
+                ]
+            ),
+            reasoning="",
+        )
+        for probabilities in values
+    ]
+
+
+def _numeric_predictions(medians: list[int]) -> list[ReasonedPrediction]:
+    bot = _create_bot()
+    return [
+        bot._numeric_prediction_from_reasoning(
+            _create_numeric_question(), _percentile_block(median)
+        )
+        for median in medians
+    ]
+
+
+@pytest.mark.parametrize(
+    "question, predictions, expected",
+    [
+        (
+            _create_binary_question(204),
+            _binary_predictions([0.4, 0.41, 0.39, 0.4]),
+            True,
+        ),
+        (
+            _create_binary_question(204),
+            _binary_predictions([0.2, 0.6, 0.3, 0.5]),
+            False,
+        ),
+        (_create_binary_question(204), _binary_predictions([0, 0, 0, 0]), True),
+        (
+            _create_binary_question(204),
+            _binary_predictions([0, 0, 0, 0.01]),
+            False,
+        ),
+        (
+            _create_multiple_choice_question(),
+            _multiple_choice_predictions(
+                [[0.2, 0.3, 0.5], [0.21, 0.3, 0.49], [0.2, 0.31, 0.49], [0.2, 0.3, 0.5]]
+            ),
+            True,
+        ),
+        (
+            _create_multiple_choice_question(),
+            _multiple_choice_predictions(
+                [[0.2, 0.3, 0.5], [0.05, 0.3, 0.65], [0.2, 0.3, 0.5], [0.2, 0.3, 0.5]]
+            ),
+            False,
+        ),
+        (
+            _create_numeric_question(),
+            _numeric_predictions([2100, 2101, 2099, 2100]),
+            True,
+        ),
+        (  # Only ~2% apart relative to the values, but a large part of the question's range
+            _create_numeric_question(),
+            _numeric_predictions([2030, 2120, 2060, 2090]),
+            False,
+        ),
+    ],
+    ids=[
+        "binary close",
+        "binary spread",
+        "binary all zero",
+        "binary zero mean with spread",
+        "multiple choice close",
+        "multiple choice spread",
+        "numeric close",
+        "numeric spread across the range",
+    ],
+)
+def test_predictions_agree(
+    question, predictions: list[ReasonedPrediction], expected: bool
+) -> None:
+    assert _create_bot()._predictions_agree(question, predictions) is expected